@@ -14,13 +14,15 @@
 # You should have received a copy of the GNU General Public License along with
 # harpy. If not, see <https://www.gnu.org/licenses/>.
 
-from collections import defaultdict
-
-from harpy._context import ActorContext, currentContext
-from harpy._messages import InitMsg, EmitMsg, SubscribeMsg, UnsubscribeMsg
+from harpy._context import ActorContext, currentContext, actorPool
+from harpy._messages import InitMsg, EmitMsg, BatchEmitMsg
+from harpy._messages import SubscribeMsg, UnsubscribeMsg
+from harpy._messages import DEFAULT_SUBSCRIBE, DEFAULT_UNSUBSCRIBE
 
 from thespian.actors import ActorTypeDispatcher
 
+import sys
+
 class BaseActor(ActorTypeDispatcher):
     """Harpy's fundamental base actor.
 
@@ -29,20 +31,68 @@ class BaseActor(ActorTypeDispatcher):
     harpy-level messages defined in the _messages module.
 
     This class is internal and should not be used directly.
+
+    Values passed to `emit` are not sent right away. Instead, they are buffered
+    and sent to each subscriber as a single `BatchEmitMsg` (or an `EmitMsg`
+    when a single value was buffered) once the message which is currently
+    being processed has been handled, or when the buffer contains
+    `_harpy_max_batch` values. The buffer only holds values of a single stream:
+    it is sent as soon as a value is emitted on another stream, so subscribers
+    of several streams receive values in the order they were emitted. Actors,
+    which may run for a long time while handling a single message, override
+    `emit` to send each value right away instead (see `_send_value`).
+
+    The subscribers of a stream are stored in tuples which are replaced, rather
+    than updated, when a subscription changes. Sending a batch can therefore
+    iterate over the subscribers without copying them first. Subscribers which
+    subscribed with a handler id are stored along with this id, which is echoed
+    in every batch sent to them. The addresses of the other subscribers are
+    stored in a separate tuple, as they all receive the same message.
     """
+    # Thespian's actor classes do not define __slots__, so instances still have
+    # a __dict__ for the attributes of subclasses.
+    __slots__ = (
+        '_harpy_subscribers', '_harpy_pending', '_harpy_pending_stream',
+        '_harpy_init_pending', '_harpy_context', 'ref'
+    )
+    _harpy_max_batch = 128
+
     @classmethod
     def spawn(cls, *args, **kwargs):
-        ref = currentContext.ctx.create(cls)
+        ref = actorPool.take(cls)
         currentContext.ctx.send(ref, InitMsg(args, kwargs))
         return cls._wrapRef(ref)
 
+    @classmethod
+    def reserve(cls, amount):
+        """Create `amount` instances of this class ahead of time.
+
+        Subsequent calls to `spawn` made in the same process initialise one of
+        these instances rather than creating a new one, as long as any remain.
+        """
+        actorPool.reserve(cls, amount)
+
     def __init__(self):
-        self._harpy_subscribers = defaultdict(list)
+        self._harpy_subscribers = {}
+        self._harpy_pending = []
+        self._harpy_pending_stream = None
         self._harpy_init_pending = True
 
+    def receiveMessage(self, msg, sender):
+        try:
+            res = super().receiveMessage(msg, sender)
+        except BaseException:
+            # Thespian retries a message which raised. Values emitted while
+            # handling it are dropped, as they would be emitted again.
+            self._harpy_pending = []
+            self._harpy_pending_stream = None
+            raise
+        self.flush()
+        return res
+
     def receiveMsg_InitMsg(self, msg, _sender):
-        if hasattr(self, "_harpy_init_pending"):
-            delattr(self, "_harpy_init_pending")
+        if self._harpy_init_pending:
+            self._harpy_init_pending = False
             self.ref = self._wrapRef(self.myAddress)
             self._harpy_context = ActorContext(self)
             with self._harpy_context as context:
@@ -52,19 +102,88 @@ class BaseActor(ActorTypeDispatcher):
                 "Actor {} received multiple init messages".format(self)
             )
 
+    # Subscribers of a stream are stored as a (shared, tagged) pair of tuples.
+    # `shared` contains the addresses of subscribers without handler id,
+    # `tagged` contains (address, handler id) pairs.
+
     def receiveMsg_SubscribeMsg(self, msg, sender):
-        self._harpy_subscribers[msg.stream].append(sender)
+        stream = sys.intern(msg.stream)
+        (shared, tagged) = self._harpy_subscribers.get(stream, ((), ()))
+        if msg.handler_id is None:
+            shared = shared + (sender,)
+        else:
+            tagged = tagged + ((sender, msg.handler_id),)
+        self._harpy_subscribers[stream] = (shared, tagged)
 
     def receiveMsg_UnsubscribeMsg(self, msg, sender):
-        self._harpy_subscribers[msg.stream].remove(sender)
+        (shared, tagged) = self._harpy_subscribers[msg.stream]
+        if msg.handler_id is None:
+            shared = _without(shared, sender)
+        else:
+            tagged = _without(tagged, (sender, msg.handler_id))
+        if shared or tagged:
+            self._harpy_subscribers[msg.stream] = (shared, tagged)
+        else:
+            del self._harpy_subscribers[msg.stream]
 
-    def _send_subscribe(self, addr, stream):
-        self._harpy_context.send(addr, SubscribeMsg(stream))
+    def _send_subscribe(self, addr, stream, handler_id = None):
+        if stream == "default" and handler_id is None:
+            msg = DEFAULT_SUBSCRIBE
+        else:
+            msg = SubscribeMsg(sys.intern(stream), handler_id)
+        self._harpy_context.send(addr, msg)
 
-    def _send_unsubscribe(self, addr, stream):
-        self._harpy_context.send(addr, UnsubscribeMsg(stream))
+    def _send_unsubscribe(self, addr, stream, handler_id = None):
+        if stream == "default" and handler_id is None:
+            msg = DEFAULT_UNSUBSCRIBE
+        else:
+            msg = UnsubscribeMsg(stream, handler_id)
+        self._harpy_context.send(addr, msg)
 
     def emit(self, val, stream = "default"):
-        for subscriber in self._harpy_subscribers[stream]:
-            self._harpy_context.send(subscriber, EmitMsg(val, stream))
+        """Emit `val` on `stream`."""
+        if stream != self._harpy_pending_stream:
+            # Only the first value of a run of values emitted on the same
+            # stream checks whether the stream has any subscribers.
+            if stream not in self._harpy_subscribers: return
+            self.flush()
+            self._harpy_pending_stream = stream
+        pending = self._harpy_pending
+        pending.append(val)
+        if len(pending) >= self._harpy_max_batch: self.flush()
+
+    def flush(self):
+        """Send all values emitted so far to the subscribers of their stream."""
+        pending = self._harpy_pending
+        if not pending: return
+        stream = self._harpy_pending_stream
+        self._harpy_pending = []
+        self._harpy_pending_stream = None
+        self._send_batch(pending, stream)
+
+    def _send_value(self, value, stream):
+        self._send_to_subscribers(EmitMsg, value, stream)
+
+    def _send_batch(self, values, stream):
+        # A lone value is sent as an EmitMsg, which does not need a list.
+        if len(values) == 1:
+            self._send_value(values[0], stream)
+        else:
+            self._send_to_subscribers(BatchEmitMsg, values, stream)
+
+    def _send_to_subscribers(self, msg_cls, payload, stream):
+        subscribers = self._harpy_subscribers.get(stream)
+        if not subscribers: return
+        (shared, tagged) = subscribers
+        send = self._harpy_context.send
+        if shared:
+            msg = msg_cls(payload, stream)
+            for subscriber in shared: send(subscriber, msg)
+        for (subscriber, handler_id) in tagged:
+            send(subscriber, msg_cls(payload, stream, handler_id))
+
+def _without(subscribers, subscriber):
+    # Removes a single occurrence, a subscriber may subscribe more than once.
+    idx = subscribers.index(subscriber)
+    return subscribers[:idx] + subscribers[idx + 1:]
 
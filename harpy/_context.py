@@ -28,24 +28,50 @@ Thespian has multiple backends called "systems". These backends are used to
 spawn actors and send them messages. Harpy uses a single of these systems and
 wraps it for internal use later. The SystemContext wraps this system.
 
+By default, harpy uses the multiprocQueueBase system, which is considerably
+faster than multiprocTCPBase when all actors run on a single host. The queue
+based system cannot span multiple hosts and may deadlock when actors are
+heavily overloaded; multiprocTCPBase should be used when this is a concern.
+The system can be chosen through the `HARPY_ACTOR_BASE` environment variable
+or through `SystemContext.overrideSystemBase`. When the default system cannot
+be started, harpy falls back to multiprocTCPBase.
+
+Besides the thespian systems, harpy can also run every actor on a dedicated
+thread inside the current process. This system is selected with the
+`harpyThreadedBase` system base and is defined in the _threadedSystem module.
+
 Note that the multiprocTCPBase system seems to be broken on OSX. As such,
-thespian must be used inside docker for now.
+thespian must be used inside docker when it is selected.
 """
 
+from harpy._threadedSystem import ThreadedActorSystem, THREADED_SYSTEM_BASE
+
 from thespian.actors import ActorSystem
 
+import contextvars
+import os
+
+_DEFAULT_SYSTEM_BASE = 'multiprocQueueBase'
+_FALLBACK_SYSTEM_BASE = 'multiprocTCPBase'
+
 class SystemContext:
-    _thespianSystem = None
+    _instance = None
 
     def __new__(cls):
-        if not cls._thespianSystem: cls._thespianSystem = super().__new__(cls)
-        return cls._thespianSystem
-
-    def __init__(self):
+        # __init__ is not used, as it would run (and reset the system) every
+        # time the singleton is obtained.
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._init_once()
+        return cls._instance
+
+    def _init_once(self):
         # Thespian does not seem to like it if the actorsystem is initialised
         # too early, so we do it on demand (in create).
         self.system = None
-        self.thespianSystemBase = 'multiprocTCPBase'
+        self.thespianSystemBase = os.environ.get(
+            'HARPY_ACTOR_BASE', _DEFAULT_SYSTEM_BASE
+        )
 
     def overrideSystemBase(self, base):
         assert self.system is None, \
@@ -56,10 +82,19 @@ class SystemContext:
         self.system.tell(dst, msg)
 
     def create(self, cls):
-        if not self.system:
-            self.system = ActorSystem(systemBase = self.thespianSystemBase)
+        if not self.system: self.system = self._start_system()
         return self.system.createActor(cls)
 
+    def _start_system(self):
+        if self.thespianSystemBase == THREADED_SYSTEM_BASE:
+            return ThreadedActorSystem()
+        try:
+            return ActorSystem(systemBase = self.thespianSystemBase)
+        except Exception:
+            if self.thespianSystemBase != _DEFAULT_SYSTEM_BASE: raise
+            self.thespianSystemBase = _FALLBACK_SYSTEM_BASE
+            return ActorSystem(systemBase = self.thespianSystemBase)
+
 class ActorContext:
     def send(self, dst, msg): self.actor.send(dst, msg)
     def create(self, cls): return self.actor.createActor(cls)
@@ -67,23 +102,72 @@ class ActorContext:
 
     def __init__(self, actor):
         self.actor = actor
-        self.prev = None
+        self.token = None
+
+    # activate and deactivate are used on the paths which handle every
+    # message, where the overhead of the context manager protocol is avoided.
+    def activate(self):
+        return currentContext.set(self)
+
+    def deactivate(self, token):
+        currentContext.reset(token)
 
     def __enter__(self):
-        self.prev = currentContext.ctx
-        currentContext.set(self)
+        self.token = self.activate()
         return self
 
     def __exit__(self, excType, excVal, excStack):
-        currentContext.set(self.prev)
-        self.prev = None
+        self.deactivate(self.token)
+        self.token = None
         return False
 
+# The current context is stored in a context variable, so every thread (and
+# asyncio task) observes the context it activated itself. This is required when
+# several actors share a process, e.g. when using the threaded actor system.
+_currentContext = contextvars.ContextVar(
+    "harpy_context", default=SystemContext()
+)
+
 class ContextWrapper:
-    def __init__(self):
-        self.ctx = SystemContext()
+    @property
+    def ctx(self):
+        return _currentContext.get()
 
     def set(self, ctx):
-        self.ctx = ctx
+        return _currentContext.set(ctx)
+
+    def reset(self, token):
+        _currentContext.reset(token)
 
 currentContext = ContextWrapper()
+
+class ActorPool:
+    """Actors created ahead of time, grouped by class.
+
+    A harpy actor does not do anything until it receives its `InitMsg`. As
+    such, an actor created in advance can be handed out by `spawn` instead of
+    creating a new actor, which hides the latency of actor creation. Actors
+    are only created in advance when requested through `reserve`, the pool is
+    not refilled automatically.
+
+    The pool belongs to the process which reserved the actors. Thespian forks
+    the processes of new actors, which would otherwise inherit the pool of
+    their creator and take actors which their creator still expects to use.
+    """
+    def __init__(self):
+        self.actors = {}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.actors.clear)
+
+    def reserve(self, cls, amount):
+        ctx = currentContext.ctx
+        addrs = [ctx.create(cls) for _ in range(amount)]
+        self.actors.setdefault(cls, []).extend(addrs)
+
+    def take(self, cls):
+        try:
+            return self.actors[cls].pop()
+        except (KeyError, IndexError):
+            return currentContext.ctx.create(cls)
+
+actorPool = ActorPool()
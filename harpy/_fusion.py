@@ -0,0 +1,293 @@
+# Copyright 2025, Mathijs Saey, Vrije Universiteit Brussel
+
+# This file is part of Harpy.
+#
+# Harpy is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Harpy is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# harpy. If not, see <https://www.gnu.org/licenses/>.
+
+"""Harpy internals. Don't rely on the behaviour of this module.
+
+Reactors pass every value they receive through a reactivex pipeline. When such
+a pipeline only consists of simple operators such as `map`, `filter`, `scan`
+and `take`, the overhead of reactivex (subjects, observers and a call per
+operator) outweighs the work done by the pipeline. This module fuses these
+pipelines into a single python function, which the reactor calls instead.
+
+Reactivex operators are opaque functions, so two mechanisms are used to find
+out which operators make up a pipeline:
+
+- Reactors pass a `ReactorSource` to the function which builds their pipeline.
+  When operators are applied to it through `pipe`, the source and the
+  operators are recorded on the resulting observable. Operators applied to
+  this observable through `pipe` are recorded as well.
+- Operators are recognised by comparing them with reference operators created
+  by the corresponding reactivex operator factory.
+
+Operators composed with `reactivex.compose` (such as `starmap`, which is
+defined as a composition) are flattened before they are recognised. Pipelines
+which cannot be fused are left to reactivex.
+
+Like a reactivex pipeline which does not handle errors, a fused pipeline stops
+processing values once one of its operators raises an exception. The
+exception is logged rather than raised, so the message which carried the value
+is not retried and the values which were already processed are not passed
+through the (stateful) operators of the pipeline again.
+"""
+
+from reactivex import Observable, Subject
+from reactivex import compose, operators
+from reactivex.disposable import Disposable
+
+import logging
+
+DROPPED = object()
+
+_logger = logging.getLogger(__name__)
+
+class ReactorSource(Observable):
+    """Source observable of a reactor, which records the operators applied to
+    it.
+
+    Values are passed to the source through `on_next`. The subject which
+    forwards these values to the observers of the source is only created when
+    the source is subscribed to. Sources of which every pipeline is fused are
+    never subscribed to, so they never create a subject.
+    """
+    def __init__(self):
+        super().__init__()
+        self.subject = None
+
+    def _subscribe_core(self, observer, scheduler=None):
+        if self.subject is None: self.subject = _SourceSubject()
+        return self.subject._subscribe_core(observer, scheduler)
+
+    def on_next(self, value):
+        if self.subject is not None: self.subject.on_next(value)
+
+    def pipe(self, *ops):
+        return _traced(super().pipe(*ops), self, ops)
+
+class _SourceSubject(Subject):
+    """Subject used by a `ReactorSource`.
+
+    Reactor sources are only used by the thread of their reactor and never
+    complete. The observers are stored in a tuple which is replaced when
+    they change, so values are passed to them without taking the locks of the
+    subject or copying the observers.
+    """
+    def __init__(self):
+        super().__init__()
+        self.snapshot = ()
+
+    def _subscribe_core(self, observer, scheduler=None):
+        subscription = super()._subscribe_core(observer, scheduler)
+        self.snapshot = tuple(self.observers)
+
+        def dispose():
+            subscription.dispose()
+            self.snapshot = tuple(self.observers)
+
+        return Disposable(dispose)
+
+    def on_next(self, value):
+        for observer in self.snapshot: observer.on_next(value)
+
+class _TracedObservable(Observable):
+    """Observable created by applying operators to a `ReactorSource`."""
+    def pipe(self, *ops):
+        (source, traced_ops) = self._harpy_trace
+        return _traced(super().pipe(*ops), source, traced_ops + ops)
+
+def _traced(observable, source, ops):
+    if observable is source: return observable
+    observable._harpy_trace = (source, ops)
+    # Operators create plain observables, these are turned into traced
+    # observables so operators piped onto them are recorded as well.
+    if type(observable) is Observable:
+        observable.__class__ = _TracedObservable
+    return observable
+
+def trace(observable):
+    """Obtain the source and operators of an observable.
+
+    Returns a `(subject, operators)` tuple if `observable` was created by
+    applying operators to a `ReactorSource` through (chained) `pipe` calls,
+    `None` otherwise.
+    """
+    if isinstance(observable, ReactorSource): return (observable, ())
+    return getattr(observable, '_harpy_trace', None)
+
+# Operator recognition
+# --------------------
+
+def _closure_values(fn):
+    values = []
+    for cell in fn.__closure__ or ():
+        value = cell.cell_contents
+        # Curried operators store their arguments as a tuple.
+        if isinstance(value, tuple):
+            values.extend(value)
+        else:
+            values.append(value)
+    return values
+
+class _OperatorKind:
+    """Operators created by calling `factory` with arguments of a given type.
+
+    The factory is called with `probes`, one for each argument. The probes are
+    located in the closure of the resulting reference operator, which tells
+    where the arguments of other operators created by the factory are stored.
+    """
+    def __init__(self, factory, *probes):
+        reference = factory(*probes)
+        self.code = reference.__code__
+        self.values = _closure_values(reference)
+        self.idxs = [
+            next(idx for idx, value in enumerate(self.values) if value is probe)
+            for probe in probes
+        ]
+
+    def arguments(self, op):
+        """Return the arguments `op` was created with, or None if `op` was not
+        created by the factory of this kind."""
+        if getattr(op, '__code__', None) is not self.code: return None
+        values = _closure_values(op)
+        if len(values) != len(self.values): return None
+        for idx, (value, reference) in enumerate(zip(values, self.values)):
+            if idx in self.idxs or value is reference: continue
+            # Values are compared by identity, as comparing arguments provided
+            # by the user may raise or return a non-boolean. The only exception
+            # are the keyword arguments of curried operators, which are stored
+            # in a fresh dict every time; only empty dicts are considered equal.
+            if type(value) is dict and type(reference) is dict:
+                if not value and not reference: continue
+            return None
+        return [values[idx] for idx in self.idxs]
+
+def _fn_probe():
+    return lambda *args: None
+
+# Recognition relies on internals of reactivex: the code objects of operators
+# and the layout of their closures. It was checked against reactivex 4.0 and
+# 5.1. When the reference operators cannot be set up, e.g. because these
+# internals changed, fusion is disabled and all pipelines are left to
+# reactivex.
+try:
+    _MAP = _OperatorKind(operators.map, _fn_probe())
+    _FILTER = _OperatorKind(operators.filter, _fn_probe())
+    _SCAN = _OperatorKind(lambda acc: operators.scan(acc), _fn_probe())
+    _SCAN_SEED = _OperatorKind(operators.scan, _fn_probe(), object())
+    # A fresh int object, rather than a cached small int, is used as probe.
+    _TAKE = _OperatorKind(operators.take, int("1000003"))
+    _COMPOSE_CODE = compose().__code__
+except Exception:
+    _logger.warning(
+        "Reactivex operators cannot be recognised, pipelines are not fused",
+        exc_info=True
+    )
+    _FUSION_ENABLED = False
+else:
+    _FUSION_ENABLED = True
+
+_NO_SEED = object()
+
+def _scanner(accumulator, seed):
+    accumulation = seed
+
+    def scan(value):
+        nonlocal accumulation
+        if accumulation is _NO_SEED:
+            accumulation = value
+        else:
+            accumulation = accumulator(accumulation, value)
+        return accumulation
+
+    return scan
+
+def _taker(count):
+    remaining = count
+
+    def take(_value):
+        nonlocal remaining
+        if remaining <= 0: return False
+        remaining -= 1
+        return True
+
+    return take
+
+def _stage(op):
+    # Stages are (is_filter, fn) tuples. Stateful operators obtain fresh state
+    # every time they are turned into a stage.
+    if args := _MAP.arguments(op):
+        mapper = args[0]
+        return (False, mapper if mapper is not None else (lambda value: value))
+    if args := _FILTER.arguments(op):
+        return (True, args[0])
+    if args := _SCAN.arguments(op):
+        return (False, _scanner(args[0], _NO_SEED))
+    if args := _SCAN_SEED.arguments(op):
+        return (False, _scanner(args[0], args[1]))
+    if args := _TAKE.arguments(op):
+        if args[0] < 0: return None
+        return (True, _taker(args[0]))
+    return None
+
+def _flatten(ops):
+    for op in ops:
+        if getattr(op, '__code__', None) is _COMPOSE_CODE:
+            yield from _flatten(_closure_values(op))
+        else:
+            yield op
+
+# Fusion
+# ------
+
+def fuse(ops):
+    """Fuse a sequence of reactivex operators into a single function.
+
+    Returns `None` if any of the operators cannot be fused, or if fusion is
+    disabled. Otherwise, returns a function which passes a value through all
+    operators and returns the result, or `DROPPED` if the value was filtered
+    out.
+    """
+    if not _FUSION_ENABLED: return None
+    stages = []
+    try:
+        for op in _flatten(ops):
+            stage = _stage(op)
+            if stage is None: return None
+            stages.append(stage)
+    except Exception:
+        # Operators which do not look like the reference operators, e.g. a
+        # closure with an empty cell, are left to reactivex.
+        return None
+
+    failed = False
+
+    def fused(value):
+        nonlocal failed
+        if failed: return DROPPED
+        try:
+            for (is_filter, fn) in stages:
+                if is_filter:
+                    if not fn(value): return DROPPED
+                else:
+                    value = fn(value)
+        except Exception:
+            failed = True
+            _logger.exception(
+                "Fused pipeline failed on %s and is stopped", value
+            )
+            return DROPPED
+        return value
+
+    return fused
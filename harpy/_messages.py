@@ -21,33 +21,56 @@ These messages are system-level messages used by the harpy runtime.
 
 from dataclasses import dataclass
 from typing import Any
+import sys
 
+# Stream names are used as dictionary keys by every actor, so they are interned
+# where they enter harpy.
+DEFAULT_STREAM = sys.intern("default")
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class InitMsg:
     """Message sent by BaseActor to call __init_actor__"""
     args: tuple
     kwargs: dict
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class EmitMsg:
     """Message sent when an upstream actor emits a value on a stream"""
     value: Any
-    stream: str
+    stream: str = DEFAULT_STREAM
+    handler_id: Any = None
 
-@dataclass
+@dataclass(slots=True, frozen=True)
+class BatchEmitMsg:
+    """Message sent when an upstream actor emits several values on a stream"""
+    values: list
+    stream: str = DEFAULT_STREAM
+    handler_id: Any = None
+
+@dataclass(slots=True, frozen=True)
 class ReactToMsg:
     """Message sent when a reactor or window should subscribe to a stream"""
     ref: Any
     source: str
-    stream: str
+    stream: str = DEFAULT_STREAM
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SubscribeMsg:
-    """Message sent to signify another actor is subscribed to a stream"""
-    stream: str
+    """Message sent to signify another actor is subscribed to a stream
+
+    The `handler_id` is chosen by the subscriber and included in every value
+    emitted to it on the stream.
+    """
+    stream: str = DEFAULT_STREAM
+    handler_id: Any = None
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UnsubscribeMsg:
     """Message sent to signify another actor unsubscribed from a stream"""
-    stream: str
+    stream: str = DEFAULT_STREAM
+    handler_id: Any = None
+
+# Messages are immutable, so subscriptions to the default stream share a single
+# instance of each message.
+DEFAULT_SUBSCRIBE = SubscribeMsg(DEFAULT_STREAM)
+DEFAULT_UNSUBSCRIBE = UnsubscribeMsg(DEFAULT_STREAM)
@@ -0,0 +1,102 @@
+# Copyright 2025, Mathijs Saey, Vrije Universiteit Brussel
+
+# This file is part of Harpy.
+#
+# Harpy is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Harpy is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# harpy. If not, see <https://www.gnu.org/licenses/>.
+
+"""Harpy internals. Don't rely on the behaviour of this module.
+
+This module defines a minimal actor system which runs every actor inside the
+current process, each on a dedicated thread. Every actor owns a message queue
+which is drained by its thread, so an actor which is busy never delays the
+processing of messages sent to other actors.
+
+The system can be selected by passing `THREADED_SYSTEM_BASE` to
+`SystemContext.overrideSystemBase` (or through the `HARPY_ACTOR_BASE`
+environment variable). It only implements the parts of the thespian API which
+are used by harpy: creating actors, sending messages and wakeups.
+"""
+
+from thespian.actors import ActorAddress, WakeupMessage
+
+import itertools
+import logging
+import queue
+import threading
+
+THREADED_SYSTEM_BASE = 'harpyThreadedBase'
+
+_logger = logging.getLogger(__name__)
+
+class _ActorThread:
+    """Thread and message queue of a single actor.
+
+    Thespian actors interact with the actor system through their `_myRef`
+    attribute, which is set to an instance of this class.
+    """
+    def __init__(self, system, cls, address):
+        self.system = system
+        self.address = address
+        self.globalName = None
+        self.queue = queue.SimpleQueue()
+        self.instance = cls()
+        self.instance._myRef = self
+        self.thread = threading.Thread(
+            target=self._run, name=str(address), daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            msg, sender = self.queue.get()
+            try:
+                self.instance.receiveMessage(msg, sender)
+            except Exception:
+                _logger.exception(
+                    "Actor %s failed to process %s", self.instance, msg
+                )
+
+    def actor_send(self, dst, msg):
+        self.system.deliver(dst, msg, self.address)
+
+    def createActor(self, cls, *_args):
+        return self.system.createActor(cls)
+
+    def wakeupAfter(self, period, payload=None):
+        msg = WakeupMessage(period, payload)
+        timer = threading.Timer(
+            period.total_seconds(), self.queue.put, ((msg, self.address),)
+        )
+        timer.daemon = True
+        timer.start()
+
+class ThreadedActorSystem:
+    """Actor system which runs each actor on a dedicated thread."""
+    def __init__(self):
+        self._actors = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def createActor(self, cls):
+        with self._lock:
+            address = ActorAddress(next(self._ids))
+            self._actors[address.addressDetails] = _ActorThread(
+                self, cls, address
+            )
+        return address
+
+    def deliver(self, dst, msg, sender):
+        self._actors[dst.addressDetails].queue.put((msg, sender))
+
+    def tell(self, dst, msg):
+        self.deliver(dst, msg, None)
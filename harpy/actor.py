@@ -43,6 +43,9 @@ various common actor "types".
 from harpy.ref import ActorRef
 from harpy._baseActor import BaseActor
 
+import itertools
+import sys
+
 class Actor(BaseActor):
     """Actor class.
 
@@ -59,24 +62,41 @@ class Actor(BaseActor):
     method receives a message.
     """
 
+    __slots__ = ('_harpy_monitoring', '_harpy_monitored', '_harpy_handler_ids')
+
     @staticmethod
     def _wrapRef(addr): return ActorRef(addr)
 
     def __init__(self):
         super().__init__()
-        self._harpy_monitoring = []
+        # Maps handler ids to the method called for a monitored stream.
+        self._harpy_monitoring = {}
+        self._harpy_handler_ids = itertools.count()
+        # Maps stream names to (address, handler id) pairs.
+        self._harpy_monitored = {}
 
     def __init_actor__(self):
         pass
 
     def receiveUnrecognizedMessage(self, msg, sender):
-        self._harpy_dirty_internal_trick = sender
-        with self._harpy_context as context:
+        token = self._harpy_context.activate()
+        try:
             self.receive(msg)
+        finally:
+            self._harpy_context.deactivate(token)
 
     def thisActor(self):
         """Obtain a reference to the current actor instance."""
-        return self._wrapRef(self.myAddress)
+        return self.ref
+
+    def emit(self, val, stream = "default"):
+        """Emit `val` on `stream`.
+
+        Unlike reactors and windows, actors may keep running for a long time
+        while handling a message. Therefore, the values they emit are sent
+        right away rather than batched.
+        """
+        self._send_value(val, stream)
 
     def send_self_after(self, time, msg = None):
         """Send a message to the current actor instance after a timeout.
@@ -86,8 +106,11 @@ class Actor(BaseActor):
         self._harpy_context.wake_up_after(time, msg)
 
     def receiveMsg_WakeupMessage(self, msg, sender):
-        with self._harpy_context as context:
+        token = self._harpy_context.activate()
+        try:
             self.receive(msg.payload)
+        finally:
+            self._harpy_context.deactivate(token)
 
     def monitor(self, ref, method, stream = "default"):
         """Makes the actor monitor a stream of an actor, reactor or window.
@@ -97,23 +120,51 @@ class Actor(BaseActor):
         specified stream of the actor, reactor, or window, the provided method
         will be called.
         """
-        self._harpy_monitoring.append((ref.addr, stream, method))
-        self._send_subscribe(ref.addr, stream)
+        stream = sys.intern(stream)
+        handler_id = self._find_handler(ref.addr, stream)
+        if handler_id is not None:
+            self._harpy_monitoring[handler_id] = method
+            return
+        handler_id = next(self._harpy_handler_ids)
+        self._harpy_monitoring[handler_id] = method
+        monitored = self._harpy_monitored.setdefault(stream, [])
+        monitored.append((ref.addr, handler_id))
+        self._send_subscribe(ref.addr, stream, handler_id)
 
     def unmonitor(self, ref, stream = "default"):
         """Unmonitor the specified stream of an actor, reactor or window."""
-        method = self._find_method(ref.addr, stream)
-        self._harpy_monitoring.remove((ref.addr, stream, method))
-        self._send_unsubscribe(ref.addr, stream)
+        handler_id = self._find_handler(ref.addr, stream)
+        monitored = self._harpy_monitored[stream]
+        monitored.remove((ref.addr, handler_id))
+        if not monitored: del self._harpy_monitored[stream]
+        # Handler ids are not reused, values emitted before the upstream actor
+        # processes the unsubscription carry an unknown id and are ignored.
+        del self._harpy_monitoring[handler_id]
+        self._send_unsubscribe(ref.addr, stream, handler_id)
 
     def receiveMsg_EmitMsg(self, msg, sender):
-        method = self._find_method(sender, msg.stream)
-        with self._harpy_context as context:
-            if method: method(msg.value)
-
-    def _find_method(self, sender, stream):
-        for (observing, stream, method) in self._harpy_monitoring:
-            if observing == sender and stream == stream: return method
+        method = self._harpy_monitoring.get(msg.handler_id)
+        if method is None: return
+        token = self._harpy_context.activate()
+        try:
+            method(msg.value)
+        finally:
+            self._harpy_context.deactivate(token)
+
+    def receiveMsg_BatchEmitMsg(self, msg, sender):
+        method = self._harpy_monitoring.get(msg.handler_id)
+        if method is None: return
+        token = self._harpy_context.activate()
+        try:
+            for value in msg.values: method(value)
+        finally:
+            self._harpy_context.deactivate(token)
+
+    def _find_handler(self, addr, stream):
+        # Thespian addresses are not hashable, so they are compared by
+        # equality among the sources monitored on the same stream.
+        for (observing, handler_id) in self._harpy_monitored.get(stream, ()):
+            if observing == addr: return handler_id
 
 def monitor(receive_fn):
     """Create an actor from a function.
@@ -147,12 +198,18 @@ def loop(time):
         init = cls.__init_actor__
         tick = cls.tick
 
-        def wrapped_init(self, *args, **kwargs):
-            init(self, *args, **kwargs)
-            self.send_self_after(time)
+        if init is Actor.__init_actor__:
+            # The default initialiser takes no arguments, so there is no need
+            # to collect and forward them.
+            def wrapped_init(self):
+                self.send_self_after(time)
+        else:
+            def wrapped_init(self, *args, **kwargs):
+                init(self, *args, **kwargs)
+                self.send_self_after(time)
 
         def receive(self, value):
-            self.send_self_after(time)
+            self._harpy_context.wake_up_after(time, None)
             tick(self)
 
         assert issubclass(cls, Actor), "{} should subclass Actor".format(cls)
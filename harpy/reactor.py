@@ -83,8 +83,15 @@ with the `@lift` decorator serving as a shorthand for creating simple reactors.
 
 from harpy.ref import ReactorRef
 from harpy._baseActor import BaseActor
+from harpy._fusion import ReactorSource, DROPPED, trace, fuse
 
-from reactivex import Subject
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import functools
+import logging
+import queue
+
+_logger = logging.getLogger(__name__)
 
 class Reactor(BaseActor):
     """Reactor abstract base class.
@@ -92,49 +99,147 @@ class Reactor(BaseActor):
     This class defines the internals of reactors. It should not be instantiated
     directly. Instead, reactors can be created by decorating a function which
     builds a reactivex observable chain with the `@reacts_to` decorator.
+
+    Observable chains which only apply `map`, `filter`, `scan` and `take`
+    operators to a single source are fused into a single function (see the
+    _fusion module). These functions are called directly when the source
+    receives a value. When all chains of a source are fused, the source is
+    never subscribed to and reactivex is bypassed entirely.
     """
     @staticmethod
     def _wrapRef(addr): return ReactorRef(addr)
 
     def __init__(self):
         super().__init__()
-        self._harpy_sources = {}
-        self._harpy_subscriptions = []
-        for name in self.__class__._harpy_reactor_source_names:
-            self._harpy_sources[name] = Subject()
+        # Sources are stored in the order of their declaration, the position
+        # of a source is found through the _harpy_source_index of the class.
+        self._harpy_sources = tuple(
+            ReactorSource() for _ in self._harpy_reactor_source_names
+        )
+        self._harpy_fused = {}
+        # (address, source position, stream) of every stream the reactor
+        # reacts to, used to ignore duplicate react_to requests.
+        self._harpy_reactions = []
 
     def __init_actor__(self, *constructor_args, **constructor_kwargs):
-        subjects = (
-            self._harpy_sources[name] for name in
-            self.__class__._harpy_reactor_source_names
-        )
-        args = tuple(subjects) + constructor_args
+        args = self._harpy_sources + constructor_args
         dag = self.build_dag(*args, **constructor_kwargs)
         if isinstance(dag, dict):
             for stream, observable in dag.items():
-                # Workaround to ensure all subscriptions don't point to the
-                # last value of `stream`.
-                observable.subscribe(lambda value, s=stream: self.emit(value, s))
-        else:
-            dag.subscribe(lambda value: self.emit(value))
+                if self._fuse(observable, stream): continue
+                observable.subscribe(functools.partial(self.emit, stream=stream))
+        elif not self._fuse(dag, "default"):
+            dag.subscribe(self.emit)
+
+    def _fuse(self, observable, stream):
+        traced = trace(observable)
+        if traced is None: return False
+        traced_source, ops = traced
+        fused = fuse(ops)
+        if fused is None: return False
+        for idx, source in enumerate(self._harpy_sources):
+            if source is traced_source:
+                self._harpy_fused.setdefault(idx, []).append((fused, stream))
+                return True
+        return False
+
+    # Reactors subscribe with the position of the source as handler id, so
+    # emitted values can be passed to the right subject without inspecting the
+    # sender.
 
     def receiveMsg_ReactToMsg(self, msg, sender):
-        subj = self._harpy_sources[msg.source]
-        self._harpy_subscriptions.append((msg.ref.addr, msg.stream, subj))
-        self._send_subscribe(msg.ref.addr, msg.stream)
+        idx = self._harpy_source_index[msg.source]
+        # Thespian addresses are not hashable, so reactions are compared by
+        # equality.
+        reaction = (msg.ref.addr, idx, msg.stream)
+        if reaction in self._harpy_reactions: return
+        self._harpy_reactions.append(reaction)
+        self._send_subscribe(msg.ref.addr, msg.stream, idx)
 
     def receiveMsg_EmitMsg(self, msg, sender):
-        for (ref, stream, subj) in self._harpy_subscriptions:
-            if sender == ref and stream == msg.stream:
-                subj.on_next(msg.value)
+        self._push(msg.handler_id, (msg.value,))
+
+    def receiveMsg_BatchEmitMsg(self, msg, sender):
+        self._push(msg.handler_id, msg.values)
+
+    def _push(self, source, values):
+        # Sources are only subscribed to in __init_actor__, so whether the
+        # source has a subject does not change while the values are pushed.
+        subj = self._harpy_sources[source].subject
+        fused = self._harpy_fused.get(source, ())
+        emit = self.emit
+        for value in values:
+            if subj is not None: subj.on_next(value)
+            for (pipeline, stream) in fused:
+                result = pipeline(value)
+                if result is not DROPPED: emit(result, stream)
 
     def receiveUnrecognizedMessage(self, msg, _sender):
         raise RuntimeError("Reactor {} received unrecognized message: {}".format(self, msg))
 
+_DONE = object()
+
+class _DedicatedThreadReactor(Reactor):
+    """Reactor which runs its pipeline on a dedicated thread.
+
+    Received values are handed to a worker thread owned by the reactor, so the
+    reactor does not block while its pipeline runs. Thespian actors may only
+    send messages from their own thread. Therefore, values emitted by the
+    pipeline are queued by the worker and emitted by the reactor, which polls
+    the queue while the worker has outstanding work.
+    """
+    _harpy_poll_interval = timedelta(milliseconds=1)
+
+    def __init__(self):
+        super().__init__()
+        # The thread of the executor is only started when it receives work.
+        self._harpy_worker = ThreadPoolExecutor(max_workers=1)
+        self._harpy_results = queue.SimpleQueue()
+        self._harpy_outstanding = 0
+
+    def __init_actor__(self, *constructor_args, **constructor_kwargs):
+        super().__init_actor__(*constructor_args, **constructor_kwargs)
+        # Values emitted while subscribing to the pipeline.
+        self._drain()
+
+    def _push(self, source, values):
+        if not self._harpy_outstanding:
+            self._harpy_context.wake_up_after(self._harpy_poll_interval, None)
+        self._harpy_outstanding += 1
+        self._harpy_worker.submit(self._push_on_worker, source, values)
+
+    def _push_on_worker(self, source, values):
+        try:
+            super()._push(source, values)
+        except Exception:
+            _logger.exception("Reactor %s failed to process %s", self, values)
+        finally:
+            self._harpy_results.put(_DONE)
+
+    def emit(self, val, stream = "default"):
+        self._harpy_results.put((val, stream))
+
+    def receiveMsg_WakeupMessage(self, _msg, _sender):
+        self._drain()
+        if self._harpy_outstanding:
+            self._harpy_context.wake_up_after(self._harpy_poll_interval, None)
+
+    def _drain(self):
+        results = self._harpy_results
+        while True:
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                return
+            if result is _DONE:
+                self._harpy_outstanding -= 1
+            else:
+                super().emit(*result)
+
 # Creating reactors
 # -----------------
 
-def reacts_to(*source_names):
+def reacts_to(*source_names, dedicated_thread = False):
     """Reactor creation decorator.
 
     This decorator can be used to create a reactor by decorating a function.
@@ -211,13 +316,31 @@ def reacts_to(*source_names):
 
     will emit `2` on stream "left" and `3` on stream "right" if it receives
     value `1`.
+
+    Finally, reactors which perform expensive computations can be created with
+    `dedicated_thread=True`. The pipeline of such a reactor runs on a thread
+    owned by the reactor, which keeps the reactor responsive while values are
+    being processed. Values emitted by the pipeline are picked up by the
+    reactor at regular intervals (`_harpy_poll_interval`), which adds a small
+    delay before they are sent downstream.
+
+    ```
+    @reacts_to("source", dedicated_thread=True)
+    def example(source):
+        source.pipe(op.map(expensive_function))
+    ```
     """
+    base = _DedicatedThreadReactor if dedicated_thread else Reactor
+
     def reactor_fn_wrapper(reactor_fn):
         def build_dag(self, *args, **kwargs):
             return reactor_fn(*args, **kwargs)
 
-        cls = type(reactor_fn.__name__, (Reactor,), {'build_dag': build_dag})
+        cls = type(reactor_fn.__name__, (base,), {'build_dag': build_dag})
         cls._harpy_reactor_source_names = source_names
+        cls._harpy_source_index = {
+            name: idx for idx, name in enumerate(source_names)
+        }
         cls.__module__ = reactor_fn.__module__
         return cls
     return reactor_fn_wrapper
@@ -258,7 +381,8 @@ def lift(op, source_name = "default"):
             return source.pipe(op(reactor_fn))
 
         cls = type(reactor_fn.__name__, (Reactor,), {'build_dag': build_dag})
-        cls._harpy_reactor_source_names = [source_name]
+        cls._harpy_reactor_source_names = (source_name,)
+        cls._harpy_source_index = {source_name: 0}
         cls.__module__ = reactor_fn.__module__
         return cls
     return reactor_fn_wrapper
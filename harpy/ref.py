@@ -27,16 +27,22 @@ from harpy._messages import ReactToMsg
 from thespian.actors import ActorSystem
 
 class _BaseRef:
+    __slots__ = ('addr',)
+
     def __init__(self, addr): self.addr = addr
 
 class ActorRef(_BaseRef):
     """Reference to a harpy actor."""
+    __slots__ = ()
+
     def send(self, msg):
         """Send `msg` to an actor."""
         currentContext.ctx.send(self.addr, msg)
 
 class ReactorRef(_BaseRef):
     """Reference to a harpy reactor."""
+    __slots__ = ()
+
     def react_to(self, ref, source = "default", stream = "default"):
         """Tell a reactor to react to a stream of `ref`.
 
@@ -49,6 +55,8 @@ class ReactorRef(_BaseRef):
 
 class WindowRef(_BaseRef):
     """Reference to a harpy window."""
+    __slots__ = ()
+
     def react_to(self, ref, stream = "default"):
         """Tell a window to react to a stream of `ref`."""
         currentContext.ctx.send(self.addr, ReactToMsg(ref, None, stream))
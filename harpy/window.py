@@ -26,6 +26,11 @@ from harpy.ref import WindowRef
 
 from dataclasses import dataclass
 from datetime import timedelta
+import copy
+import functools
+import heapq
+import inspect
+import itertools
 import time
 import math
 
@@ -34,11 +39,69 @@ import math
 # ---------------- #
 
 class _WindowAssigner:
+    # Windows are computed for a bucket of timestamps (the windows of all
+    # timestamps in a bucket are identical) and cached, as the parameters of an
+    # assigner never change. The windows of a bucket are returned as a tuple,
+    # which is shared by every call. As values mostly arrive in order of their
+    # timestamp, the windows of the last bucket are also kept aside, which
+    # avoids the cache lookup. They are stored as a single (bucket, windows)
+    # pair, so windows using the assigner from different threads never observe
+    # a bucket with the windows of another one.
+    _harpy_cache_size = 128
+
+    def __init__(self, **durations):
+        # Durations are stored in seconds. Windows which provide integer
+        # timestamps through `timestamp_ns` use a copy of the assigner which
+        # stores them in nanoseconds (see `_in_nanoseconds`).
+        self._durations = durations
+        for (name, duration) in durations.items():
+            setattr(self, name, duration.total_seconds())
+        self._init_cache()
+
+    def _init_cache(self):
+        method = type(self)._windows_for_bucket.__get__(self)
+        self._windows_for_bucket = functools.lru_cache(
+            maxsize=self._harpy_cache_size
+        )(method)
+        self._last = (None, None)
+
+    def _in_nanoseconds(self):
+        # The assigner itself is left untouched, as it may decorate several
+        # window classes.
+        assigner = copy.copy(self)
+        for (name, duration) in self._durations.items():
+            setattr(assigner, name, duration // _MICROSECOND * 1000)
+        assigner._init_cache()
+        return assigner
+
     def __call__(self, cls):
         assert issubclass(cls, Window), "{} should subclass Window".format(cls)
-        cls._harpy_window_assigner = self
+        if cls.timestamp_ns is not Window.timestamp_ns:
+            cls.timestamp = inspect.getattr_static(cls, 'timestamp_ns')
+            cls._harpy_window_assigner = self._in_nanoseconds()
+        else:
+            cls._harpy_window_assigner = self
+        if cls._harpy_numba_jit: _jit_methods(cls)
         return cls
 
+_MICROSECOND = timedelta(microseconds=1)
+
+# Numba is an optional dependency, it is only imported when a window opts in
+# to compilation. Numba cannot compile methods which receive the window itself
+# (`self`), so only static methods are compiled.
+_JIT_METHODS = ('timestamp', 'key', 'add_to_window', 'add_batch_to_window')
+
+def _jit_methods(cls):
+    import numba
+
+    for name in _JIT_METHODS:
+        method = cls.__dict__.get(name)
+        if isinstance(method, staticmethod):
+            # njit compiles lazily, for the types of the first call, and
+            # caches the compiled code on disk.
+            compiled = numba.njit(cache=True)(method.__func__)
+            setattr(cls, name, staticmethod(compiled))
+
 class FixedWindow(_WindowAssigner):
     """Window assigner which creates non-overlapping windows of a fixed size.
 
@@ -60,13 +123,19 @@ class FixedWindow(_WindowAssigner):
     elapses.
     """
     def __init__(self, length, offset=timedelta(seconds=0)):
-        self.length = length.total_seconds()
-        self.offset = offset.total_seconds()
+        super().__init__(length=length, offset=offset)
 
     def windows_for(self, timestamp, _value):
-        start = timestamp - ((timestamp - self.offset) % self.length)
-        end = start + self.length
-        return [(start, end)]
+        bucket = (timestamp - self.offset) // self.length
+        (last_bucket, windows) = self._last
+        if bucket == last_bucket: return windows
+        windows = self._windows_for_bucket(bucket)
+        self._last = (bucket, windows)
+        return windows
+
+    def _windows_for_bucket(self, bucket):
+        start = self.offset + bucket * self.length
+        return ((start, start + self.length),)
 
 class SlidingWindow(_WindowAssigner):
     """Window assigner which creates windows with a fixed size and frequency.
@@ -86,22 +155,36 @@ class SlidingWindow(_WindowAssigner):
     be provided to change the alignment.
     """
     def __init__(self, frequency, length, offset=timedelta(seconds=0)):
-        self.frequency = frequency.total_seconds()
-        self.length = length.total_seconds()
-        self.offset = offset.total_seconds()
+        super().__init__(frequency=frequency, length=length, offset=offset)
 
     def windows_for(self, timestamp, _value):
-        last_start = timestamp - ((timestamp - self.offset) % self.frequency)
-
-        window = last_start
-        windows = []
-
-        while window > timestamp - self.length:
-            windows.append((window, window + self.length))
-            window = window - self.frequency
-
+        frequency = self.frequency
+        bucket = (timestamp - self.offset) // frequency
+        last_start = self.offset + bucket * frequency
+
+        # The timestamp belongs to every window which starts after
+        # `timestamp - length`, counting back from the last window. When the
+        # length is not a multiple of the frequency, this amount depends on
+        # the position of the timestamp inside its bucket. The amount is
+        # rounded up through floor division, which stays exact for integers.
+        amount = int(-((timestamp - last_start - self.length) // frequency))
+        (last_key, windows) = self._last
+        if (bucket, amount) == last_key: return windows
+        windows = self._windows_for_bucket(bucket, amount)
+        self._last = ((bucket, amount), windows)
         return windows
 
+    def _windows_for_bucket(self, bucket, amount):
+        frequency = self.frequency
+        length = self.length
+        offset = self.offset
+        return tuple(
+            (start, start + length)
+            for start in (
+                offset + (bucket - idx) * frequency for idx in range(amount)
+            )
+        )
+
 # -------- #
 # Triggers #
 # -------- #
@@ -114,13 +197,30 @@ class _Trigger:
         cls._harpy_window_trigger = self
         return cls
 
+    def may_fire(self, _timestamp, _run_end, _window):
+        # Whether `on_element` may complete a pane for a value with the given
+        # timestamp, when values which are not added yet belong to panes that
+        # end at `run_end` at the earliest (`None` if there are no such
+        # values). Triggers which do not know assume it may.
+        return True
+
 class EventTimeElapsedTrigger(_Trigger):
+    def may_fire(self, timestamp, run_end, window):
+        ends = window._harpy_window_ends
+        if ends and ends[0][0] < timestamp: return True
+        return run_end is not None and run_end < timestamp
+
     def on_element(self, _element, key, timestamp, window):
-        for ((start, end), key) in list(window._harpy_window_panes.keys()):
-            if timestamp > end:
-                pane = window._harpy_window_panes[((start, end), key)]
-                window.window_complete(pane)
-                del window._harpy_window_panes[((start, end), key)]
+        # Panes are popped in order of their end, so only the panes which
+        # elapsed are visited.
+        ends = window._harpy_window_ends
+        panes = window._harpy_window_panes
+        while ends and ends[0][0] < timestamp:
+            (end, _, start, key) = heapq.heappop(ends)
+            keyed = panes.get(key)
+            if keyed is None or (start, end) not in keyed: continue
+            window.window_complete(keyed.pop((start, end)))
+            if not keyed: del panes[key]
 
 # ------- #
 # Windows #
@@ -132,10 +232,16 @@ class Window(BaseActor):
     A harpy window can be created by extending this class and decorating it
     with a _window assigner_ (such as  `FixedWindow` or `SlidingWindow`). When
     this is done, the subclass must define the `timestamp`, `add_to_window` and
-    `window_complete` functions documented below. Additionally, the `key`
-    method may optionally be implemented.
+    `window_complete` functions documented below. Additionally, the `key` and
+    `add_batch_to_window` methods may optionally be implemented.
+
+    Windows which process numeric data can set `_harpy_numba_jit` to `True`
+    to compile `timestamp`, `key`, `add_to_window` and `add_batch_to_window`
+    with [numba](https://numba.pydata.org/) (which must be installed). Only
+    the methods defined as a `staticmethod` in the class are compiled.
     """
     _harpy_window_trigger = EventTimeElapsedTrigger()
+    _harpy_numba_jit = False
 
     @staticmethod
     def _wrapRef(addr): return WindowRef(addr)
@@ -143,7 +249,13 @@ class Window(BaseActor):
     def __init__(self):
         super().__init__()
         self._harpy_subscriptions = []
+        # Maps keys to a dict which maps (start, end) windows to their pane.
+        # The dict of a key only exists while the key has panes.
         self._harpy_window_panes = {}
+        # Heap of (end, id, start, key) tuples, one for every pane. The unique
+        # id ensures keys, which may not be comparable, are never compared.
+        self._harpy_window_ends = []
+        self._harpy_pane_ids = itertools.count()
 
     def __init_actor__(self):
         tick = self._harpy_window_trigger.tick_time
@@ -159,6 +271,16 @@ class Window(BaseActor):
         """
         raise NotImplementedError()
 
+    def timestamp_ns(self, value):
+        """Obtain the timestamp of a given value as an integer.
+
+        This is an optional alternative to `timestamp`, which must return the
+        timestamp as an integer amount of nanoseconds. When a window subclass
+        implements this method, it is used instead of `timestamp` and windows
+        are computed with integer arithmetic, which is faster and exact.
+        """
+        raise NotImplementedError()
+
     def key(self, value):
         """Obtain the key of a given value.
 
@@ -182,6 +304,24 @@ class Window(BaseActor):
         """
         raise NotImplementedError()
 
+    def add_batch_to_window(self, values, window):
+        """Add several data elements to a window.
+
+        Upstream actors, reactors and windows send the values they emit in
+        batches. The values of a batch which belong to the same window are
+        passed to this method as a list, along with the current contents of the
+        window. Like `add_to_window`, it must return the new contents of the
+        window. Implementing this method is optional; by default, it calls
+        `add_to_window` for each value.
+
+        Values are only passed together as long as the trigger of the window
+        cannot complete a pane in between them, so panes contain the same
+        values as when every value is received on its own.
+        """
+        for value in values:
+            window = self.add_to_window(value, window)
+        return window
+
     def window_complete(self, window):
         """Finalize a window.
 
@@ -193,22 +333,68 @@ class Window(BaseActor):
         raise NotImplementedError()
 
     def receiveMsg_ReactToMsg(self, msg, sender):
+        # Reacting to the same stream twice would add every value twice.
+        if (msg.ref.addr, msg.stream) in self._harpy_subscriptions: return
         self._harpy_subscriptions.append((msg.ref.addr, msg.stream))
         self._send_subscribe(msg.ref.addr, msg.stream)
 
     def receiveMsg_EmitMsg(self, msg, sender):
-        key = self.key(msg.value)
-        timestamp = self.timestamp(msg.value)
-        windows = self._harpy_window_assigner.windows_for(timestamp, msg.value)
+        self._receive_value(msg.value)
+
+    def receiveMsg_BatchEmitMsg(self, msg, sender):
+        # Values are grouped per window in runs, which end at every value for
+        # which the trigger may complete a pane. The run is added to the
+        # windows before the trigger is evaluated for that value, as is done
+        # when the values are received one by one.
+        trigger = self._harpy_window_trigger
+        run = {}
+        run_end = None
+        for value in msg.values:
+            key = self.key(value)
+            timestamp = self.timestamp(value)
+            fires = trigger.may_fire(timestamp, run_end, self)
+            windows = self._harpy_window_assigner.windows_for(timestamp, value)
+            for window in windows:
+                run.setdefault((window, key), []).append(value)
+                if run_end is None or window[1] < run_end: run_end = window[1]
+            if fires:
+                self._add_run(run)
+                run = {}
+                run_end = None
+                trigger.on_element(value, key, timestamp, self)
+        self._add_run(run)
+
+    def _add_run(self, run):
+        for ((window, key), values) in run.items():
+            panes = self._panes_of(key)
+            if window not in panes: self._track_pane(window, key)
+            panes[window] = self.add_batch_to_window(values, panes.get(window))
+
+    def _receive_value(self, value):
+        key = self.key(value)
+        timestamp = self.timestamp(value)
+        windows = self._harpy_window_assigner.windows_for(timestamp, value)
 
         # Add objects to the window
         for window in windows:
-            pane = self._harpy_window_panes.get((window, key))
-            updated = self.add_to_window(msg.value, pane)
-            self._harpy_window_panes[(window, key)] = updated
+            panes = self._panes_of(key)
+            if window not in panes: self._track_pane(window, key)
+            panes[window] = self.add_to_window(value, panes.get(window))
 
         # Trigger elapsed windows
-        self._harpy_window_trigger.on_element(msg.value, key, timestamp, self)
+        self._harpy_window_trigger.on_element(value, key, timestamp, self)
+
+    def _panes_of(self, key):
+        # Only called when a value is added to a window of the key, so values
+        # which belong to no window never leave an empty dict behind.
+        panes = self._harpy_window_panes.get(key)
+        if panes is None: panes = self._harpy_window_panes[key] = {}
+        return panes
+
+    def _track_pane(self, window, key):
+        (start, end) = window
+        entry = (end, next(self._harpy_pane_ids), start, key)
+        heapq.heappush(self._harpy_window_ends, entry)
 
     def receiveMsg_WakeupMessage(self, _msg, _sender):
         self._harpy_window_trigger.on_tick(self)